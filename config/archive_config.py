@@ -0,0 +1,15 @@
+"""
+Offline Archive Classification Settings
+"""
+
+# Number of worker processes (None means use all CPU cores)
+NUM_WORKERS = None
+
+# Approximate size in bytes of each mbox range handed to a worker
+MBOX_CHUNK_SIZE = 32 * 1024 * 1024
+
+# Number of .eml files handed to a worker at a time
+EML_BATCH_SIZE = 500
+
+# Default output file for verdicts (.csv or .jsonl)
+ARCHIVE_OUTPUT_FILE = 'logs/archive_verdicts.csv'
@@ -13,7 +13,10 @@ sys.path.append(os.path.dirname(os.path.abspath(__file__)))
 
 from utils.gmail_handler import GmailHandler
 from models.classifier import SpamClassifier
+from utils import archive_handler
+from config.model_config import MODEL_FILE, VECTORIZER_FILE
 from config.gmail_config import FETCH_LIMIT, EMAIL_QUERY, ENABLE_MOVE_TO_SPAM
+from config.archive_config import NUM_WORKERS, MBOX_CHUNK_SIZE, EML_BATCH_SIZE, ARCHIVE_OUTPUT_FILE
 
 # Setup logging
 os.makedirs('logs', exist_ok=True)
@@ -97,6 +100,34 @@ def classify_and_process_emails():
         logger.error(f"Error: {e}", exc_info=True)
 
 
+def classify_archive(paths, output_path=ARCHIVE_OUTPUT_FILE, workers=NUM_WORKERS):
+    """Classify mbox files and EML directories offline using a process pool"""
+    try:
+        logger.info("Starting archive classification...")
+        
+        if not os.path.exists(MODEL_FILE) or not os.path.exists(VECTORIZER_FILE):
+            logger.error("Model not found. Train first: python models/trainer.py")
+            return
+        
+        workers = workers or os.cpu_count() or 1
+        logger.info(f"Using {workers} worker process(es), writing to {output_path}")
+        
+        with archive_handler.VerdictWriter(output_path) as writer:
+            stats = archive_handler.classify_archives(
+                paths, writer, workers, MBOX_CHUNK_SIZE, EML_BATCH_SIZE)
+        
+        total = stats['total']
+        logger.info("Archive Classification Summary:")
+        not_spam = total - stats['spam'] - stats['unknown']
+        logger.info(f"  Total: {total}, Spam: {stats['spam']}, Not spam: {not_spam}, Unknown: {stats['unknown']}")
+        logger.info(f"  Skipped: {stats['skipped']}, Failed tasks: {len(stats['failed'])}")
+        for failed in stats['failed']:
+            logger.warning(f"  Failed: {failed}")
+        
+    except Exception as e:
+        logger.error(f"Error: {e}", exc_info=True)
+
+
 def run_scheduler():
     """Run scheduler to process emails every 6 hours"""
     logger.info("Starting Gmail Spam Classifier")
@@ -120,10 +151,18 @@ def main():
     parser = argparse.ArgumentParser(description='Gmail Spam Classifier')
     parser.add_argument('--test', action='store_true', 
                        help='Run once and exit (test mode)')
+    parser.add_argument('--archive', nargs='+', metavar='PATH',
+                       help='Classify mbox files or EML directories offline and exit')
+    parser.add_argument('--output', default=ARCHIVE_OUTPUT_FILE,
+                       help='Verdict output file for --archive (.csv or .jsonl)')
+    parser.add_argument('--workers', type=int, default=NUM_WORKERS,
+                       help='Worker processes for --archive (default: all cores)')
     
     args = parser.parse_args()
     
-    if args.test:
+    if args.archive:
+        classify_archive(args.archive, output_path=args.output, workers=args.workers)
+    elif args.test:
         logger.info("Running in TEST mode")
         classify_and_process_emails()
         logger.info("Test completed.")
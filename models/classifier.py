@@ -50,31 +50,37 @@ class SpamClassifier:
     
     def predict(self, text):
         """Predict if text is spam or not"""
+        return self.predict_batch([text])[0]
+    
+    def predict_batch(self, texts):
+        """Predict a list of texts with a single vectorizer/model call"""
         if self.model is None or self.vectorizer is None:
-            return {
+            return [{
                 'prediction': 'unknown',
                 'confidence': 0.0,
                 'spam_probability': 0.0
-            }
+            } for _ in texts]
         
-        # Preprocess text
-        preprocessed_text = self.preprocessor.preprocess(text)
+        if not texts:
+            return []
         
-        # Transform to features
-        text_vectorized = self.vectorizer.transform([preprocessed_text])
+        # Preprocess and transform to features
+        preprocessed_texts = [self.preprocessor.preprocess(text) for text in texts]
+        texts_vectorized = self.vectorizer.transform(preprocessed_texts)
         
-        # Make prediction (0=spam, 1=ham)
-        prediction = self.model.predict(text_vectorized)[0]
-        probabilities = self.model.predict_proba(text_vectorized)[0]
+        # Class probabilities (0=spam, 1=ham)
+        probabilities = self.model.predict_proba(texts_vectorized)
         
-        spam_prob = probabilities[0]  # class 0 is spam
-        is_spam = spam_prob >= self.confidence_threshold
+        results = []
+        for spam_prob in probabilities[:, 0]:  # class 0 is spam
+            spam_prob = float(spam_prob)
+            is_spam = spam_prob >= self.confidence_threshold
+            results.append({
+                'prediction': 'spam' if is_spam else 'not_spam',
+                'confidence': max(spam_prob, 1 - spam_prob),
+                'spam_probability': spam_prob
+            })
         
-        return {
-            'prediction': 'spam' if is_spam else 'not_spam',
-            'confidence': max(spam_prob, 1 - spam_prob),
-            'spam_probability': spam_prob
-        }
-    
+        return results
 
 
@@ -0,0 +1,334 @@
+"""
+Tests for the offline archive handler
+"""
+
+import os
+import csv
+import json
+import types
+
+import pytest
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from utils import archive_handler
+from utils.archive_handler import (
+    VerdictWriter, classify_archives, find_mbox_ranges, iter_mbox_range, parse_message
+)
+
+
+def make_message(i, newline='\n'):
+    lines = [
+        f"From sender{i}@example.com Mon Jan  1 00:00:00 2024",
+        f"From: sender{i}@example.com",
+        f"Subject: message {i}",
+        f"Message-ID: <{i}@example.com>",
+        "",
+        f"body {i} win money now" if i % 2 else f"body {i} meeting notes",
+        "",
+    ]
+    return newline.join(lines).encode() + newline.encode()
+
+
+def write_mbox(path, count, newline='\n'):
+    with open(path, 'wb') as f:
+        for i in range(count):
+            f.write(make_message(i, newline))
+    return str(path)
+
+
+class StubClassifier:
+    """Flags messages mentioning money as spam"""
+
+    def predict_batch(self, texts):
+        results = []
+        for text in texts:
+            spam_prob = 0.9 if 'money' in text else 0.1
+            results.append({
+                'prediction': 'spam' if spam_prob >= 0.7 else 'not_spam',
+                'confidence': max(spam_prob, 1 - spam_prob),
+                'spam_probability': spam_prob
+            })
+        return results
+
+
+def init_stub_worker():
+    archive_handler._classifier = StubClassifier()
+
+
+class UnloadedClassifier:
+    """Behaves like SpamClassifier when the model failed to load"""
+
+    def __init__(self, model_path=None, vectorizer_path=None):
+        self.model_path = model_path
+        self.model = None
+
+
+def init_failing_worker():
+    raise LookupError('Resource stopwords not found')
+
+
+def read_all_messages(path, chunk_size):
+    messages = []
+    for _, start, end in find_mbox_ranges(path, chunk_size):
+        messages.extend(raw for _, raw in iter_mbox_range(path, start, end))
+    return messages
+
+
+# mbox splitting
+
+@pytest.mark.parametrize('chunk_size', [1, 50, 137, 1000, 10 ** 6])
+def test_mbox_ranges_cover_every_message_once(tmp_path, chunk_size):
+    path = write_mbox(tmp_path / 'a.mbox', 20)
+
+    ranges = find_mbox_ranges(path, chunk_size)
+    messages = read_all_messages(path, chunk_size)
+
+    assert ranges[0][1] == 0
+    assert ranges[-1][2] == os.path.getsize(path)
+    for (_, _, end), (_, start, _) in zip(ranges, ranges[1:]):
+        assert end == start
+    assert [parse_message(m)['subject'] for m in messages] == [f"message {i}" for i in range(20)]
+
+
+def test_mbox_ranges_start_on_envelope_lines(tmp_path):
+    path = write_mbox(tmp_path / 'a.mbox', 20)
+
+    with open(path, 'rb') as f:
+        data = f.read()
+    for _, start, _ in find_mbox_ranges(path, 137):
+        assert data[start:start + 5] == b'From '
+
+
+def test_empty_mbox_has_no_ranges(tmp_path):
+    path = tmp_path / 'empty.mbox'
+    path.write_bytes(b'')
+
+    assert find_mbox_ranges(str(path), 100) == []
+
+
+def test_crlf_mbox(tmp_path):
+    path = write_mbox(tmp_path / 'crlf.mbox', 10, newline='\r\n')
+
+    messages = read_all_messages(path, 90)
+
+    assert len(messages) == 10
+    info = parse_message(messages[3])
+    assert info['subject'] == 'message 3'
+    assert info['from'] == 'sender3@example.com'
+    assert 'win money' in info['body']
+
+
+def test_mbox_unescapes_from_lines(tmp_path):
+    path = tmp_path / 'a.mbox'
+    path.write_bytes(b'From a@b Mon Jan  1 00:00:00 2024\nSubject: s\n\n'
+                     b'>From the start\n>>From nested\nnot >From here\n')
+
+    [message] = read_all_messages(str(path), 100)
+
+    assert parse_message(message)['body'] == 'From the start\n>From nested\nnot >From here\n'
+
+
+def test_mbox_trailing_envelope_without_newline_is_skipped(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_handler, '_classifier', StubClassifier())
+    path = tmp_path / 'a.mbox'
+    path.write_bytes(make_message(0) + b'From truncated@b Mon Jan  1 00:00:00 2024')
+
+    verdicts, skipped = archive_handler.classify_mbox_range((str(path), 0, os.path.getsize(path)))
+
+    assert len(verdicts) == 1
+    assert skipped == 1
+
+
+def test_file_without_envelope_is_rejected(tmp_path):
+    path = tmp_path / 'single.txt'
+    path.write_bytes(b'Subject: only\nFrom: z\n\nbody\n')
+
+    with pytest.raises(ValueError):
+        find_mbox_ranges(str(path), 100)
+
+
+# Message parsing
+
+def test_parse_8bit_headers():
+    raw = (b'Message-ID: <\xe9@x>\nFrom: Jos\xe9 <j@x>\nSubject: caf\xe9\n\nbody\n')
+
+    info = parse_message(raw)
+
+    assert info['message_id'] == '<\xe9@x>'
+    assert info['from'] == 'Jos\xe9 <j@x>'
+    assert info['subject'] == 'caf\xe9'
+    assert info['body'] == 'body\n'
+
+
+def test_parse_utf8_headers():
+    raw = b'From: Jos\xc3\xa9 <j@x>\nSubject: caf\xc3\xa9 cr\xc3\xa8me\n\nbody\n'
+
+    info = parse_message(raw)
+
+    assert info['from'] == 'Jos\xe9 <j@x>'
+    assert info['subject'] == 'caf\xe9 cr\xe8me'
+
+
+def test_parse_encoded_headers():
+    raw = b'Subject: =?utf-8?q?caf=C3=A9?=\nFrom: a@b\n\nbody\n'
+
+    assert parse_message(raw)['subject'] == 'caf\xe9'
+
+
+def test_parse_unknown_charset():
+    raw = (b'Subject: s\nContent-Type: text/plain; charset="x-not-a-charset"\n\n'
+           b'plain body\n')
+
+    assert parse_message(raw)['body'] == 'plain body\n'
+
+
+def test_parse_multipart():
+    raw = (b'Subject: multi\nMIME-Version: 1.0\n'
+           b'Content-Type: multipart/mixed; boundary="XX"\n\n'
+           b'--XX\nContent-Type: text/plain; charset="utf-8"\n\nplain part\n'
+           b'--XX\nContent-Type: text/html; charset="utf-8"\n'
+           b'Content-Transfer-Encoding: base64\n\nPGI+aHRtbCBwYXJ0PC9iPg==\n'
+           b'--XX\nContent-Type: application/octet-stream\n\nAAAA\n'
+           b'--XX--\n')
+
+    body = parse_message(raw)['body']
+
+    assert 'plain part' in body
+    assert '<b>html part</b>' in body
+    assert 'AAAA' not in body
+
+
+def test_parse_missing_headers():
+    info = parse_message(b'\nbody only\n')
+
+    assert info['message_id'] == ''
+    assert info['from'] == 'Unknown'
+    assert info['subject'] == 'No Subject'
+
+
+# Output
+
+VERDICT = {
+    'source': 'a.mbox:0',
+    'message_id': '<1@x>',
+    'from': 'a@b',
+    'subject': 'hello, "world"',
+    'prediction': 'spam',
+    'confidence': 0.9,
+    'spam_probability': 0.9
+}
+
+
+def test_verdict_writer_csv(tmp_path):
+    path = str(tmp_path / 'out' / 'verdicts.csv')
+
+    with VerdictWriter(path) as writer:
+        writer.write([VERDICT])
+        writer.write([])
+
+    with open(path, newline='', encoding='utf-8') as f:
+        rows = list(csv.DictReader(f))
+    assert len(rows) == 1
+    assert rows[0]['subject'] == 'hello, "world"'
+    assert rows[0]['spam_probability'] == '0.9'
+
+
+def test_verdict_writer_jsonl(tmp_path):
+    path = str(tmp_path / 'verdicts.jsonl')
+
+    with VerdictWriter(path) as writer:
+        writer.write([VERDICT, VERDICT])
+
+    with open(path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+    assert rows == [VERDICT, VERDICT]
+
+
+@pytest.mark.parametrize('name', ['verdicts.json', 'verdicts.txt', 'verdicts'])
+def test_verdict_writer_rejects_unknown_extension(tmp_path, name):
+    with pytest.raises(ValueError):
+        VerdictWriter(str(tmp_path / name))
+
+
+# End to end
+
+def test_classify_archives_with_two_workers(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_handler, 'PREDICT_BATCH_SIZE', 4)
+    mbox_path = write_mbox(tmp_path / 'a.mbox', 30)
+
+    eml_dir = tmp_path / 'eml'
+    (eml_dir / 'nested').mkdir(parents=True)
+    for i in range(5):
+        (eml_dir / 'nested' / f"{i}.eml").write_bytes(make_message(100 + i).split(b'\n', 1)[1])
+    (eml_dir / 'ignored.txt').write_bytes(b'not an email')
+    single_eml = tmp_path / 'single.eml'
+    single_eml.write_bytes(b'Subject: only\nFrom: z\n\nbody\n')
+
+    not_mbox = tmp_path / 'notes.txt'
+    not_mbox.write_bytes(b'Subject: only\nFrom: z\n\nbody\n')
+    missing = str(tmp_path / 'missing.mbox')
+
+    output_path = str(tmp_path / 'verdicts.jsonl')
+    paths = [mbox_path, str(eml_dir), str(single_eml), str(not_mbox), missing]
+    with VerdictWriter(output_path) as writer:
+        stats = classify_archives(paths, writer, 2, mbox_chunk_size=200, eml_batch_size=2,
+                                  initializer=init_stub_worker)
+
+    with open(output_path, encoding='utf-8') as f:
+        rows = [json.loads(line) for line in f]
+
+    assert stats['total'] == len(rows) == 36
+    assert stats['spam'] == sum(1 for r in rows if r['prediction'] == 'spam')
+    assert stats['skipped'] == 0
+    assert stats['failed'] == [str(not_mbox), missing]
+
+    subjects = {r['subject'] for r in rows}
+    assert subjects >= {f"message {i}" for i in range(30)}
+    assert subjects >= {f"message {100 + i}" for i in range(5)}
+    assert 'only' in subjects
+    assert {r['prediction'] for r in rows if r['subject'] == 'message 1'} == {'spam'}
+    assert {r['prediction'] for r in rows if r['subject'] == 'message 2'} == {'not_spam'}
+
+
+def test_run_task_reports_errors():
+    def broken(task):
+        raise RuntimeError('boom')
+
+    result = archive_handler.run_task((broken, ['a.eml']))
+
+    assert result['verdicts'] == []
+    assert result['error'] == 'RuntimeError: boom'
+    assert 'a.eml' in result['task']
+
+
+def test_unreadable_eml_files_are_counted(tmp_path, monkeypatch):
+    monkeypatch.setattr(archive_handler, '_classifier', StubClassifier())
+    good = tmp_path / 'good.eml'
+    good.write_bytes(b'Subject: ok\n\nbody\n')
+
+    verdicts, skipped = archive_handler.classify_eml_batch(
+        [str(good), str(tmp_path / 'missing.eml')])
+
+    assert len(verdicts) == 1
+    assert skipped == 1
+
+
+def test_classify_archives_stops_when_worker_init_fails(tmp_path):
+    mbox_path = write_mbox(tmp_path / 'a.mbox', 30)
+
+    with VerdictWriter(str(tmp_path / 'verdicts.jsonl')) as writer:
+        with pytest.raises(RuntimeError, match='LookupError: Resource stopwords not found'):
+            classify_archives([mbox_path], writer, 2, mbox_chunk_size=200, eml_batch_size=2,
+                              initializer=init_failing_worker)
+
+
+def test_init_worker_raises_when_model_not_loaded(monkeypatch):
+    fake_module = types.ModuleType('models.classifier')
+    fake_module.SpamClassifier = UnloadedClassifier
+    monkeypatch.setitem(sys.modules, 'models.classifier', fake_module)
+    monkeypatch.setattr(archive_handler, '_classifier', None)
+
+    with pytest.raises(RuntimeError, match='Model not loaded'):
+        archive_handler.init_worker('missing.pkl', 'missing_vectorizer.pkl')
@@ -0,0 +1,375 @@
+"""
+Offline Archive Handler
+Reads exported mbox files and EML directories for bulk classification
+"""
+
+import os
+import re
+import csv
+import json
+import mmap
+import time
+import email
+import logging
+from collections import deque
+from multiprocessing import Pool
+from email import policy
+from email.header import decode_header
+
+import sys
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+logger = logging.getLogger(__name__)
+
+# mbox messages start with a "From " envelope line
+MBOX_ENVELOPE = b'From '
+MBOX_SEPARATOR = b'\n' + MBOX_ENVELOPE
+
+# Body lines escaped as ">From " (mboxo/mboxrd) lose one ">" when read back
+MBOX_ESCAPED_FROM = re.compile(rb'^>(>*From )', re.MULTILINE)
+
+# Messages are scored in batches of this size inside a worker
+PREDICT_BATCH_SIZE = 256
+
+# Tasks queued per worker before waiting on results (bounds memory use)
+TASKS_PER_WORKER = 2
+
+VERDICT_FIELDS = ['source', 'message_id', 'from', 'subject',
+                  'prediction', 'confidence', 'spam_probability']
+
+# Per-process classifier, created once by init_worker
+_classifier = None
+
+# Per-process initializer error, reported back by run_task
+_init_error = None
+
+
+def find_mbox_ranges(path, chunk_size):
+    """Split an mbox file into (path, start, end) byte ranges on message boundaries"""
+    file_size = os.path.getsize(path)
+    if file_size == 0:
+        return []
+
+    ranges = []
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        if mm[:len(MBOX_ENVELOPE)] != MBOX_ENVELOPE:
+            raise ValueError(f"Not an mbox file (no 'From ' envelope line): {path}")
+
+        start = 0
+        while start < file_size:
+            boundary = mm.find(MBOX_SEPARATOR, start + chunk_size)
+            end = file_size if boundary == -1 else boundary + 1
+            ranges.append((path, start, end))
+            start = end
+
+    return ranges
+
+
+def iter_mbox_range(path, start, end):
+    """Yield (offset, raw_bytes) for each message inside an mbox byte range
+
+    Fragments with no content after the envelope line are yielded as None.
+    """
+    with open(path, 'rb') as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+        pos = start
+        while pos < end:
+            boundary = mm.find(MBOX_SEPARATOR, pos, end)
+            msg_end = end if boundary == -1 else boundary + 1
+
+            # Skip the "From " envelope line
+            header_start = mm.find(b'\n', pos, msg_end)
+            if header_start == -1:
+                yield pos, None
+            else:
+                yield pos, MBOX_ESCAPED_FROM.sub(rb'\1', mm[header_start + 1:msg_end])
+
+            pos = msg_end
+
+
+def iter_eml_batches(directory, batch_size):
+    """Yield lists of .eml file paths found under a directory"""
+    batch = []
+    for root, _, files in os.walk(directory):
+        for name in sorted(files):
+            if name.lower().endswith('.eml'):
+                batch.append(os.path.join(root, name))
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+
+    if batch:
+        yield batch
+
+
+def _decode_bytes(data, charset):
+    """Decode header bytes, treating unknown 8-bit data as UTF-8 then latin-1"""
+    if charset and charset != 'unknown-8bit':
+        try:
+            return data.decode(charset, errors='replace')
+        except LookupError:
+            pass
+    try:
+        return data.decode('utf-8')
+    except UnicodeDecodeError:
+        return data.decode('latin-1')
+
+
+def _decode_header_value(value):
+    """Decode RFC 2047 encoded or raw 8-bit header value"""
+    if not value:
+        return ''
+    try:
+        parts = decode_header(value)
+    except Exception:
+        return str(value)
+
+    return ''.join(data if isinstance(data, str) else _decode_bytes(data, charset)
+                   for data, charset in parts)
+
+
+def parse_message(raw_bytes):
+    """Extract message id, sender, subject and body text from raw message bytes"""
+    message = email.message_from_bytes(raw_bytes, policy=policy.compat32)
+
+    body_text = ""
+    for part in message.walk():
+        if part.get_content_type() in ['text/plain', 'text/html']:
+            payload = part.get_payload(decode=True)
+            if payload:
+                charset = part.get_content_charset() or 'utf-8'
+                try:
+                    body_text += payload.decode(charset, errors='ignore')
+                except LookupError:
+                    body_text += payload.decode('utf-8', errors='ignore')
+
+    return {
+        'message_id': _decode_header_value(message.get('Message-ID')).strip(),
+        'from': _decode_header_value(message.get('From')) or 'Unknown',
+        'subject': _decode_header_value(message.get('Subject')) or 'No Subject',
+        'body': body_text
+    }
+
+
+def init_worker(model_path=None, vectorizer_path=None):
+    """Load the classifier once per worker process"""
+    global _classifier
+    from models.classifier import SpamClassifier
+    _classifier = SpamClassifier(model_path, vectorizer_path)
+
+    if _classifier.model is None:
+        raise RuntimeError(
+            f"Model not loaded from {_classifier.model_path}. Train first: python models/trainer.py")
+
+
+def _init_worker_safely(initializer, initargs):
+    """Run the worker initializer, recording its error instead of killing the worker"""
+    global _init_error
+    try:
+        initializer(*initargs)
+    except Exception as e:
+        _init_error = f"{type(e).__name__}: {e}"
+
+
+def _classify_messages(messages):
+    """Classify (source, raw_bytes) pairs in batches, returning (verdicts, skipped)"""
+    verdicts = []
+    batch = []
+    skipped = 0
+
+    def flush():
+        texts = [f"{info['subject']} {info['body']}".strip() for _, info in batch]
+        for (source, info), result in zip(batch, _classifier.predict_batch(texts)):
+            verdicts.append({
+                'source': source,
+                'message_id': info['message_id'],
+                'from': info['from'],
+                'subject': info['subject'],
+                'prediction': result['prediction'],
+                'confidence': round(float(result['confidence']), 4),
+                'spam_probability': round(float(result['spam_probability']), 4)
+            })
+        batch.clear()
+
+    for source, raw_bytes in messages:
+        if raw_bytes is None:
+            skipped += 1
+            continue
+
+        try:
+            info = parse_message(raw_bytes)
+        except Exception:
+            skipped += 1
+            continue
+
+        batch.append((source, info))
+        if len(batch) >= PREDICT_BATCH_SIZE:
+            flush()
+
+    if batch:
+        flush()
+
+    return verdicts, skipped
+
+
+def classify_mbox_range(task):
+    """Worker task: classify every message in an mbox byte range"""
+    path, start, end = task
+    messages = ((f"{path}:{offset}", raw) for offset, raw in iter_mbox_range(path, start, end))
+    return _classify_messages(messages)
+
+
+def _read_eml_files(paths):
+    """Yield (path, raw_bytes) for each .eml file, with None for unreadable files"""
+    for path in paths:
+        try:
+            with open(path, 'rb') as f:
+                yield path, f.read()
+        except OSError:
+            yield path, None
+
+
+def classify_eml_batch(paths):
+    """Worker task: classify a batch of .eml files"""
+    return _classify_messages(_read_eml_files(paths))
+
+
+def describe_task(func, task):
+    """Human readable description of a task for logging"""
+    if func is classify_mbox_range:
+        return f"{task[0]} bytes {task[1]}-{task[2]}"
+    return f"{len(task)} .eml file(s) starting at {task[0]}"
+
+
+def run_task(job):
+    """Worker entry point: run a (worker function, task) pair, capturing errors"""
+    func, task = job
+    if _init_error:
+        return {
+            'task': describe_task(func, task),
+            'verdicts': [],
+            'skipped': 0,
+            'error': _init_error,
+            'init_error': True
+        }
+
+    try:
+        verdicts, skipped = func(task)
+        error = None
+    except Exception as e:
+        verdicts, skipped = [], 0
+        error = f"{type(e).__name__}: {e}"
+
+    return {
+        'task': describe_task(func, task),
+        'verdicts': verdicts,
+        'skipped': skipped,
+        'error': error,
+        'init_error': False
+    }
+
+
+def iter_archive_tasks(paths, mbox_chunk_size, eml_batch_size, failed):
+    """Yield (worker function, task) pairs, appending unusable paths to failed"""
+    for path in paths:
+        if os.path.isdir(path):
+            for batch in iter_eml_batches(path, eml_batch_size):
+                yield classify_eml_batch, batch
+        elif os.path.isfile(path) and path.lower().endswith('.eml'):
+            yield classify_eml_batch, [path]
+        elif os.path.isfile(path):
+            try:
+                byte_ranges = find_mbox_ranges(path, mbox_chunk_size)
+            except (OSError, ValueError) as e:
+                logger.warning(f"Skipping {path}: {e}")
+                failed.append(path)
+                continue
+            for byte_range in byte_ranges:
+                yield classify_mbox_range, byte_range
+        else:
+            logger.warning(f"Archive path not found: {path}")
+            failed.append(path)
+
+
+def classify_archives(paths, writer, workers, mbox_chunk_size, eml_batch_size,
+                      initializer=init_worker, initargs=()):
+    """Classify archives across a process pool, writing verdicts as tasks finish
+
+    Raises RuntimeError if the workers fail to initialize (e.g. the model cannot be loaded).
+    """
+    stats = {'total': 0, 'spam': 0, 'unknown': 0, 'skipped': 0, 'failed': []}
+    start_time = time.time()
+
+    def handle(result):
+        if result['init_error']:
+            raise RuntimeError(f"Worker initialization failed: {result['error']}")
+
+        if result['error']:
+            logger.error(f"  Task failed ({result['task']}): {result['error']}")
+            stats['failed'].append(result['task'])
+            return
+
+        if result['skipped']:
+            logger.warning(f"  Skipped {result['skipped']} unreadable email(s) in {result['task']}")
+
+        writer.write(result['verdicts'])
+        stats['total'] += len(result['verdicts'])
+        stats['spam'] += sum(1 for v in result['verdicts'] if v['prediction'] == 'spam')
+        stats['unknown'] += sum(1 for v in result['verdicts'] if v['prediction'] == 'unknown')
+        stats['skipped'] += result['skipped']
+
+        elapsed = max(time.time() - start_time, 1e-6)
+        logger.info(f"  Classified {stats['total']} email(s) ({stats['total'] / elapsed:.0f}/s)")
+
+    # Keep a bounded window of in-flight tasks so memory stays constant
+    max_pending = workers * TASKS_PER_WORKER
+    pending = deque()
+
+    with Pool(workers, initializer=_init_worker_safely, initargs=(initializer, initargs)) as pool:
+        tasks = iter_archive_tasks(paths, mbox_chunk_size, eml_batch_size, stats['failed'])
+        for job in tasks:
+            pending.append(pool.apply_async(run_task, (job,)))
+            if len(pending) >= max_pending:
+                handle(pending.popleft().get())
+
+        while pending:
+            handle(pending.popleft().get())
+
+    return stats
+
+
+class VerdictWriter:
+    """Incrementally writes verdict rows to a CSV or JSONL file"""
+
+    def __init__(self, output_path):
+        extension = os.path.splitext(output_path)[1].lower()
+        if extension not in ['.csv', '.jsonl']:
+            raise ValueError(f"Unsupported output format '{extension}', use .csv or .jsonl")
+
+        self.output_path = output_path
+        self.is_jsonl = extension == '.jsonl'
+        self.file = None
+        self.csv_writer = None
+
+    def __enter__(self):
+        output_dir = os.path.dirname(self.output_path)
+        if output_dir:
+            os.makedirs(output_dir, exist_ok=True)
+
+        self.file = open(self.output_path, 'w', encoding='utf-8', newline='')
+        if not self.is_jsonl:
+            self.csv_writer = csv.DictWriter(self.file, fieldnames=VERDICT_FIELDS)
+            self.csv_writer.writeheader()
+        return self
+
+    def write(self, verdicts):
+        """Write a list of verdict rows and flush them to disk"""
+        for verdict in verdicts:
+            if self.is_jsonl:
+                self.file.write(json.dumps(verdict, ensure_ascii=False) + '\n')
+            else:
+                self.csv_writer.writerow(verdict)
+        self.file.flush()
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        if self.file:
+            self.file.close()